@@ -1,9 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
-from service import proceedMovieRecommendation, proceedMovieDescription, proceedAvailableLanguages, proceedAvailableGenres
-from inputTypes import GetMovieRecommendationsInput, GetMovieDescriptionInput
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request
+import json
+import threading
+from config import INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, apply_runtime_config
+from inference import BoundedExecutor, ExecutorSaturatedError
+from service import proceedMovieRecommendation, proceedMovieDescription, proceedAvailableLanguages, proceedAvailableGenres, proceedReadiness, proceedCacheStats, proceedDiagnostics, proceedMovieCount, proceedMovieRecommendationStages, encodeRecommendationQuery, loadRecommender
+from subtitles import startModelEviction
+from inputTypes import GetMovieRecommendationsInput, GetMovieDescriptionInput, GetMovieCountInput
 
-app = FastAPI()
+# Dedicated threads for model inference, requests beyond its bounded queue get rejected
+inference_executor = BoundedExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Limit torch threads per worker before any model gets loaded
+    apply_runtime_config()
+    # Load and warm up the models in the background, so uvicorn can bind its port immediately
+    threading.Thread(target=loadRecommender, daemon=True).start()
+    # Unload description models that have been idle for a while, independent of incoming requests
+    startModelEviction()
+    yield
+    inference_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -19,25 +40,102 @@ app.add_middleware(
 def read_root():
     return {"Advanced": "Information Retrieval"}
 
+@app.get("/ready")
+def ready():
+    readiness = proceedReadiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/diagnostics")
+def diagnostics():
+    return proceedDiagnostics()
+
+@app.get("/cacheStats")
+def cache_stats():
+    return proceedCacheStats()
+
+def require_ready(components=None):
+    states = proceedReadiness()["components"]
+    if any(states[component] != "ready" for component in components or states.keys()):
+        raise HTTPException(status_code=503, detail="Recommender is still loading")
+
+def saturated_error():
+    return HTTPException(status_code=503, detail="Too many requests, please try again later",
+                         headers={"Retry-After": "1"})
+
+def invalid_preferences_error(e: ValueError):
+    # Preferences that are invalid or match no movies are client errors
+    return HTTPException(status_code=400, detail=str(e))
+
+async def run_inference(fn, *args):
+    try:
+        return await inference_executor.run(fn, *args)
+    except ExecutorSaturatedError:
+        raise saturated_error()
+
+def cached_response(request: Request, content, etag: str):
+    # Browsers revalidate with If-None-Match and get an empty 304 while the dataset is unchanged
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content, headers=headers)
+
 @app.get("/availableGenres")
-def available_genres():
-    genres = proceedAvailableGenres()
-    return {"genres": genres}
+def available_genres(request: Request):
+    require_ready(["dataset"])
+    genres, etag = proceedAvailableGenres()
+    return cached_response(request, genres, etag)
 
 @app.get("/availableLanguages")
-def available_languages():
-    languages = proceedAvailableLanguages()
-    return {"languages": languages}
+def available_languages(request: Request):
+    require_ready(["dataset"])
+    languages, etag = proceedAvailableLanguages()
+    return cached_response(request, languages, etag)
+
+@app.post("/movieCount")
+def movie_count(input: GetMovieCountInput):
+    require_ready(["dataset"])
+    try:
+        count = proceedMovieCount(input)
+    except ValueError as e:
+        raise invalid_preferences_error(e)
+    return {"count": count}
 
 @app.post("/movieRecommendation")
-def movie_recommendation(input: GetMovieRecommendationsInput):
+async def movie_recommendation(input: GetMovieRecommendationsInput):
+    require_ready()
     print("movieRecommendation with body:", input.dict())
-    recommended_movies = proceedMovieRecommendation(input)
-    return {"movies": recommended_movies}
+    try:
+        query_embedding = await encodeRecommendationQuery(input)
+        recommended_movies = await run_inference(proceedMovieRecommendation, input, query_embedding)
+    except ValueError as e:
+        raise invalid_preferences_error(e)
+    return {"movies": recommended_movies["movies"], "nextOffset": recommended_movies["nextOffset"]}
+
+@app.post("/movieRecommendation/stream")
+async def movie_recommendation_stream(input: GetMovieRecommendationsInput):
+    require_ready()
+    print("movieRecommendation/stream with body:", input.dict())
+    # Wait for the first stage, so that a saturated executor or invalid preferences still result in a 503 or 400
+    try:
+        query_embedding = await encodeRecommendationQuery(input)
+        stages = inference_executor.stream(proceedMovieRecommendationStages, input, True, query_embedding)
+        first_stage = await anext(stages)
+    except ExecutorSaturatedError:
+        raise saturated_error()
+    except ValueError as e:
+        raise invalid_preferences_error(e)
+
+    async def lines():
+        # One JSON object per line: the retrieval preview (unless cached) and the final ranking
+        yield json.dumps(first_stage) + "\n"
+        async for stage in stages:
+            yield json.dumps(stage) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @app.post("/movieDescription")
-def movie_description(input: GetMovieDescriptionInput):
+async def movie_description(input: GetMovieDescriptionInput):
     print("movieDescription with body:", input.dict())
-    movie_description = proceedMovieDescription(input)
+    movie_description = await run_inference(proceedMovieDescription, input)
     print(movie_description)
     return {"genre": movie_description["genre"], "summary": movie_description["summary"]}
@@ -0,0 +1,47 @@
+from sentence_transformers import SentenceTransformer
+import torch
+from transformers import AutoTokenizer, pipeline
+
+# "torch": fp32 models on the selected device, "quantized": dynamically int8-quantized torch models (CPU only),
+# "onnx": ONNX Runtime exports (CPU, requires optimum[onnxruntime])
+BACKENDS = ["torch", "quantized", "onnx"]
+
+
+def _quantize(model: torch.nn.Module) -> torch.nn.Module:
+    # Linear layers dominate the transformer inference cost, their weights get stored as int8
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_semantic_model(model_name: str, backend: str, device) -> SentenceTransformer:
+    if backend == "torch":
+        model = SentenceTransformer(model_name)
+        model.to(device)
+        return model
+
+    if backend == "quantized":
+        return _quantize(SentenceTransformer(model_name, device="cpu"))
+
+    if backend == "onnx":
+        # Exports the model on first use
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+    raise ValueError(f"Invalid inference backend: {backend}")
+
+
+def load_emotion_pipeline(model_name: str, backend: str, device):
+    if backend == "torch":
+        return pipeline("text-classification", model=model_name, device=device)
+
+    if backend == "quantized":
+        classifier = pipeline("text-classification", model=model_name, device="cpu")
+        classifier.model = _quantize(classifier.model)
+        return classifier
+
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        return pipeline("text-classification", model=model, tokenizer=tokenizer)
+
+    raise ValueError(f"Invalid inference backend: {backend}")
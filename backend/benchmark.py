@@ -0,0 +1,104 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from backends import BACKENDS, load_emotion_pipeline, load_semantic_model
+from config import get_device
+from recommender import SEMANTIC_MODEL, EMOTION_MODEL, get_emotion_distributions
+
+DATASET_PATH = "../data/movies_dataset_preprocessed.parquet"
+
+QUERIES = [
+    "dark gritty crime in a big city",
+    "emotional family drama",
+    "humorous road trip with friends",
+    "inspiring true sports story",
+    "intense survival thriller",
+    "melancholic love story",
+    "mysterious disappearance in a small town",
+    "relaxing animated adventure",
+    "romantic comedy in paris",
+    "suspenseful heist",
+    "thought-provoking science fiction about artificial intelligence",
+    "uplifting musical"
+]
+
+
+def run_backend(backend: str, device, texts: list[str], overviews: list[str], batch_size: int) -> dict:
+    print(f"Loading {backend} models...")
+    model = load_semantic_model(SEMANTIC_MODEL, backend, device)
+    emotion_analyzer = load_emotion_pipeline(EMOTION_MODEL, backend, device)
+
+    # Warm up, so that lazy initialization does not count towards the throughput
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    get_emotion_distributions(emotion_analyzer, overviews[:batch_size], batch_size=batch_size)
+
+    print(f"Encoding {len(texts)} texts...")
+    start_time = time.time()
+    corpus = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    embedding_time = time.time() - start_time
+
+    print(f"Classifying {len(overviews)} overviews...")
+    start_time = time.time()
+    emotions = get_emotion_distributions(emotion_analyzer, overviews, batch_size=batch_size)
+    emotion_time = time.time() - start_time
+
+    queries = model.encode(QUERIES, normalize_embeddings=True)
+
+    return {
+        "embedding_throughput": len(texts) / embedding_time,
+        "emotion_throughput": len(overviews) / emotion_time,
+        "similarities": queries @ corpus.T,
+        "emotions": emotions
+    }
+
+
+def top_k_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    # Share of the reference top k per query that the candidate also ranks in its top k
+    reference_top = np.argpartition(-reference, k, axis=1)[:, :k]
+    candidate_top = np.argpartition(-candidate, k, axis=1)[:, :k]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(reference_top, candidate_top)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends against the fp32 torch baseline")
+    parser.add_argument("--samples", type=int, default=2000, help="number of movies to encode and classify")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=10, help="cutoff for the ranking agreement")
+    parser.add_argument("--backends", nargs="+", default=["quantized", "onnx"], choices=BACKENDS)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(DATASET_PATH, columns=["overview", "rich_features"])
+    df = df.sample(n=min(args.samples, len(df)), random_state=42)
+    texts = df["rich_features"].astype(str).tolist()
+    overviews = df["overview"].astype(str).tolist()
+
+    device = get_device()
+    baseline = run_backend("torch", device, texts, overviews, args.batch_size)
+
+    results = {}
+    for backend in args.backends:
+        results[backend] = run_backend(backend, device, texts, overviews, args.batch_size)
+
+    print("=" * 50 + " SUMMARY " + "=" * 50)
+    print("\ntorch (fp32 baseline):")
+    print(f"\t- Embedding throughput: {baseline['embedding_throughput']:.1f} texts/s")
+    print(f"\t- Emotion throughput: {baseline['emotion_throughput']:.1f} texts/s")
+
+    for backend, result in results.items():
+        embedding_speedup = result["embedding_throughput"] / baseline["embedding_throughput"]
+        emotion_speedup = result["emotion_throughput"] / baseline["emotion_throughput"]
+        overlap = top_k_overlap(baseline["similarities"], result["similarities"], args.top_k)
+        label_agreement = np.mean(result["emotions"].argmax(axis=1) == baseline["emotions"].argmax(axis=1))
+        probability_error = np.abs(result["emotions"] - baseline["emotions"]).mean()
+
+        print(f"\n{backend}:")
+        print(f"\t- Embedding throughput: {result['embedding_throughput']:.1f} texts/s ({embedding_speedup:.2f}x)")
+        print(f"\t- Emotion throughput: {result['emotion_throughput']:.1f} texts/s ({emotion_speedup:.2f}x)")
+        print(f"\t- Semantic top-{args.top_k} overlap: {overlap:.2%}")
+        print(f"\t- Emotion label agreement: {label_agreement:.2%}")
+        print(f"\t- Mean absolute emotion probability difference: {probability_error:.4f}")
+
+
+if __name__ == "__main__":
+    main()
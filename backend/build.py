@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+from pathlib import Path
+import time
+import hnswlib
+import numpy as np
+import pandas as pd
+import pickle
+import scipy.sparse as sp
+from sentence_transformers import SentenceTransformer
+from sklearn.feature_extraction.text import TfidfVectorizer
+from backends import load_emotion_pipeline, load_semantic_model
+from config import INFERENCE_BACKEND, apply_runtime_config, get_device
+from recommender import (SEMANTIC_MODEL, EMOTION_MODEL, EMBEDDINGS_PATH, EMBEDDING_IDS_PATH, ANN_INDEX_PATH,
+                         EMOTIONS_PATH, TFIDF_MODEL_PATH, TFIDF_MATRIX_PATH, get_emotion_distributions)
+
+DATASET_PATH = "../data/movies_dataset_preprocessed.parquet"
+# Source fingerprints of the movies in the stores (see preprocess.add_fingerprints), rows aligned with the stores
+FINGERPRINTS_PATH = "../data/movies_fingerprints.npy"
+# Settings the stores were built with, rows of a build with different settings cannot be reused
+MANIFEST_PATH = "../data/movies_build_manifest.json"
+
+TFIDF_PARAMS = {"max_features": 5000, "min_df": 2, "max_df": 0.95, "stop_words": "english", "ngram_range": (1, 2)}
+
+
+def build_embeddings(df: pd.DataFrame, model: SentenceTransformer) -> np.ndarray:
+    embeddings = model.encode(
+        df["rich_features"].to_numpy(),
+        batch_size=64,
+        show_progress_bar=True,
+        normalize_embeddings=True
+    )
+
+    # Normalized vectors are precise enough in half precision and halve the store size
+    return embeddings.astype(np.float16)
+
+
+def build_ann_index(embeddings: np.ndarray) -> hnswlib.Index:
+    # Embeddings are normalized, so the inner product equals the cosine similarity
+    index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+    index.init_index(max_elements=embeddings.shape[0], ef_construction=200, M=32)
+    # Labels are the rows of the embedding store
+    index.add_items(embeddings.astype(np.float32), np.arange(embeddings.shape[0]))
+    return index
+
+
+def build_emotions(df: pd.DataFrame, emotion_analyzer) -> np.ndarray:
+    return get_emotion_distributions(emotion_analyzer, df["overview"].astype(str).tolist(), batch_size=64)
+
+
+def build_tfidf(df: pd.DataFrame) -> tuple[TfidfVectorizer, sp.csr_matrix]:
+    tfidf = TfidfVectorizer(**TFIDF_PARAMS)
+    tfidf_matrix = tfidf.fit_transform(df["rich_features"].fillna(""))
+    return tfidf, tfidf_matrix.tocsr()
+
+
+def build_manifest() -> dict:
+    return {
+        "semantic_model": SEMANTIC_MODEL,
+        "emotion_model": EMOTION_MODEL,
+        "inference_backend": INFERENCE_BACKEND,
+        # Round trip through JSON, so that the tuple compares equal to the stored list
+        "tfidf": json.loads(json.dumps(TFIDF_PARAMS))
+    }
+
+
+def has_same_settings() -> bool:
+    # Vectors of different models or backends do not share a vector space, so they must not be mixed in one store
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f) == build_manifest()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+
+def find_previous_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Returns for every movie its row in the previously built stores, or -1 if it is new or has changed
+    """
+    store_paths = [FINGERPRINTS_PATH, EMBEDDINGS_PATH, EMOTIONS_PATH, TFIDF_MODEL_PATH, TFIDF_MATRIX_PATH]
+    if not all(Path(path).exists() for path in store_paths):
+        return np.full(len(df), -1)
+
+    if not has_same_settings():
+        print("Build settings differ from the previous build, rebuilding all movies")
+        return np.full(len(df), -1)
+
+    previous = pd.Index(np.load(FINGERPRINTS_PATH))
+    previous_rows = pd.Series(np.arange(len(previous)), index=previous)
+    previous_rows = previous_rows[~previous_rows.index.duplicated()]
+    return previous_rows.reindex(df["fingerprint"].to_numpy()).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def is_up_to_date(previous_rows: np.ndarray) -> bool:
+    # Same movies in the same order as the previous build, so every store can be kept as it is
+    store_paths = [FINGERPRINTS_PATH, EMBEDDING_IDS_PATH, ANN_INDEX_PATH]
+    if len(previous_rows) == 0 or not all(Path(path).exists() for path in store_paths) or not has_same_settings():
+        return False
+
+    return len(np.load(FINGERPRINTS_PATH, mmap_mode="r")) == len(previous_rows) and \
+        (previous_rows == np.arange(len(previous_rows))).all()
+
+
+def update_rows(previous: np.ndarray, previous_rows: np.ndarray, compute, df: pd.DataFrame) -> np.ndarray:
+    # Copy unchanged rows from the previous store and compute only new or changed ones
+    reused = previous_rows >= 0
+
+    rows = np.empty((len(df), previous.shape[1]), dtype=previous.dtype)
+    rows[reused] = previous[previous_rows[reused]]
+    if not reused.all():
+        rows[~reused] = compute(df[~reused])
+    return rows
+
+
+def update_tfidf(previous_rows: np.ndarray, df: pd.DataFrame) -> tuple[TfidfVectorizer, sp.csr_matrix]:
+    # Keeps vocabulary and IDF weights of the previous fit, run with --full from time to time to refit them
+    with open(TFIDF_MODEL_PATH, "rb") as f:
+        tfidf = pickle.load(f)
+    previous_matrix = sp.load_npz(TFIDF_MATRIX_PATH).tocsr()
+
+    reused = np.flatnonzero(previous_rows >= 0)
+    changed = np.flatnonzero(previous_rows < 0)
+
+    if changed.size == 0:
+        return tfidf, previous_matrix[previous_rows]
+
+    stacked = sp.vstack([
+        previous_matrix[previous_rows[reused]],
+        tfidf.transform(df["rich_features"].iloc[changed].fillna(""))
+    ]).tocsr()
+
+    # Restore the dataset order of the stacked rows
+    return tfidf, stacked[np.argsort(np.concatenate([reused, changed]))]
+
+
+def save_array(path: str, array: np.ndarray) -> None:
+    # Replace atomically, running workers keep their memory map of the previous file
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the stores the recommender loads at startup")
+    parser.add_argument("--full", action="store_true", help="rebuild everything instead of only new or changed movies")
+    args = parser.parse_args()
+
+    print("Starting build")
+
+    print("Reading dataset")
+    df = pd.read_parquet(DATASET_PATH, columns=["id", "overview", "rich_features", "fingerprint"])
+
+    previous_rows = np.full(len(df), -1) if args.full else find_previous_rows(df)
+    print(f"Reusing {(previous_rows >= 0).sum()} of {len(df)} movies from the previous build")
+
+    if is_up_to_date(previous_rows):
+        print("No new, changed or removed movies, keeping the previous build")
+        return
+
+    apply_runtime_config()
+    device = get_device()
+
+    # Use the same backend as the recommender, so that corpus and query vectors come from the same model
+    print(f"Initializing models ({INFERENCE_BACKEND} backend)")
+    model = load_semantic_model(SEMANTIC_MODEL, INFERENCE_BACKEND, device)
+    emotion_analyzer = load_emotion_pipeline(EMOTION_MODEL, INFERENCE_BACKEND, device)
+
+    incremental = (previous_rows >= 0).any()
+
+    print("Encoding rich features")
+    if incremental:
+        embeddings = update_rows(np.load(EMBEDDINGS_PATH, mmap_mode="r"), previous_rows,
+                                 lambda changed: build_embeddings(changed, model), df)
+    else:
+        embeddings = build_embeddings(df, model)
+
+    print("Scoring emotions of overviews")
+    if incremental:
+        emotions = update_rows(np.load(EMOTIONS_PATH, mmap_mode="r"), previous_rows,
+                               lambda changed: build_emotions(changed, emotion_analyzer), df)
+    else:
+        emotions = build_emotions(df, emotion_analyzer)
+
+    print("Fitting TF-IDF")
+    if incremental:
+        tfidf, tfidf_matrix = update_tfidf(previous_rows, df)
+    else:
+        tfidf, tfidf_matrix = build_tfidf(df)
+    print(f"TF-IDF vocabulary size: {len(tfidf.vocabulary_)}")
+
+    # The graph is rebuilt from the stored embeddings, which is cheap compared to encoding
+    print("Building ANN index")
+    index = build_ann_index(embeddings)
+
+    print("Saving stores")
+    save_array(EMBEDDINGS_PATH, embeddings)
+    save_array(EMOTIONS_PATH, emotions)
+    save_array(EMBEDDING_IDS_PATH, df["id"].to_numpy(dtype=np.int64))
+    save_array(FINGERPRINTS_PATH, df["fingerprint"].to_numpy(dtype=np.uint64))
+    index.save_index(ANN_INDEX_PATH)
+    with open(TFIDF_MODEL_PATH, "wb") as f:
+        pickle.dump(tfidf, f)
+    sp.save_npz(TFIDF_MATRIX_PATH, tfidf_matrix)
+
+    # Written after the stores, so that an interrupted rebuild with new settings is redone completely
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(build_manifest(), f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+    print(f"Stored {embeddings.shape[0]} embeddings of dimension {embeddings.shape[1]}")
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+
+    main()
+
+    run_time = time.time() - start_time
+    print(f"Finished building in {run_time}s")
@@ -48,31 +48,16 @@ def get_movie_description(input: GetMovieDescriptionInput):
     return description
 
 def get_available_languages(recommender):
-    languages = []
-
-    for i in range(len(recommender.dataset)):
-        if recommender.dataset["original_language"][i] not in languages:
-            languages.append(recommender.dataset["original_language"][i])
-
-    return languages
+    return list(recommender.facets["languages"])
 
 def get_available_genres(recommender):
-    result = []
-
-    for i in range(len(recommender.dataset)):
-        genres = recommender.dataset["genres"][i].split("-")
-        for genre in genres:
-            if genre in result:
-                continue
-            result.append(genre)
-
-    return result
+    return list(recommender.facets["genres"])
 
 def main():
-    use_default = input("Use default dataset path (../data/movies_dataset_preprocessed.csv)? (Y/n): ").lower()
+    use_default = input("Use default dataset path (../data/movies_dataset_preprocessed.parquet)? (Y/n): ").lower()
 
     if len(use_default) == 0 or use_default == "y":
-        dataset_path = "../data/movies_dataset_preprocessed.csv"
+        dataset_path = "../data/movies_dataset_preprocessed.parquet"
     else:
         dataset_path = input("Enter the path to your dataset: ")
 
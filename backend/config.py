@@ -0,0 +1,80 @@
+import os
+import threading
+import torch
+
+
+def _available_cores() -> int:
+    # Respects CPU affinity (e.g. container limits) where the platform supports it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Threads running model inference for the API (recommendations and descriptions)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Requests that may wait for a free inference thread, further requests are rejected until the queue drains
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+
+# Query texts arriving within this window (or until the batch is full) are encoded together, the API encodes them
+# before a request takes an inference thread, so that every request in flight can join a batch
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+
+# Candidates of the cheap first ranking stage that get re-ranked with the emotion aware scoring
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "200"))
+
+# Inference backend of the sentence embedder and emotion model: "torch", "quantized" or "onnx" (see backends.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Uvicorn worker processes sharing the machine (uvicorn reads WEB_CONCURRENCY as its default for --workers too)
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Torch threads per worker process, by default the available cores are split evenly between the workers
+TORCH_INTRA_OP_THREADS = int(os.getenv("TORCH_INTRA_OP_THREADS", "0")) or max(1, _available_cores() // WEB_WORKERS)
+TORCH_INTER_OP_THREADS = int(os.getenv("TORCH_INTER_OP_THREADS", "1"))
+
+_runtime_applied = False
+_runtime_lock = threading.Lock()
+
+
+def apply_runtime_config() -> None:
+    """
+    Applies the torch thread settings once per process, has to run before the first model is loaded
+    """
+    global _runtime_applied
+
+    with _runtime_lock:
+        if _runtime_applied:
+            return
+
+        torch.set_num_threads(TORCH_INTRA_OP_THREADS)
+        try:
+            torch.set_num_interop_threads(TORCH_INTER_OP_THREADS)
+        except RuntimeError as e:
+            # Only possible before any inter-op parallel work has started
+            print(f"Could not set inter-op threads: {e}")
+
+        _runtime_applied = True
+        print(f"Runtime config: {runtime_diagnostics()}")
+
+
+def get_device():
+    if torch.cuda.is_available():
+        print("CUDA available")
+        return torch.device("cuda")
+    elif torch.backends.mps.is_available():
+        print("MPS available")
+        return torch.device("mps")
+    else:
+        print("Fallback to CPU")
+        return torch.device("cpu")
+
+
+def runtime_diagnostics() -> dict:
+    return {
+        "available_cores": _available_cores(),
+        "web_workers": WEB_WORKERS,
+        "intra_op_threads": torch.get_num_threads(),
+        "inter_op_threads": torch.get_num_interop_threads(),
+        "inference_backend": INFERENCE_BACKEND,
+        "inference_workers": INFERENCE_WORKERS,
+        "inference_queue_size": INFERENCE_QUEUE_SIZE
+    }
@@ -253,9 +253,9 @@ def load_or_generate_testcases(cwd = "../evaluation/"):
     return test_cases
 
 def reduce_dataset(dataset_path, reduced_path, percent):
-    df = pd.read_csv(dataset_path)
+    df = pd.read_parquet(dataset_path)
     df = df.sample(frac=percent, random_state=42)
-    df.to_csv(reduced_path)
+    df.to_parquet(reduced_path, index=False)
 
 def main():
     if len(sys.argv) != 3 and len(sys.argv) != 4:
@@ -280,8 +280,8 @@ def main():
 
     test_cases = np.random.choice(np.array(test_cases), size=num_test_cases, replace=False)
 
-    original_path = "../data/movies_dataset_preprocessed.csv"
-    reduced_path = "../data/movies_dataset_preprocessed_reduced.csv"
+    original_path = "../data/movies_dataset_preprocessed.parquet"
+    reduced_path = "../data/movies_dataset_preprocessed_reduced.parquet"
 
     if not os.path.exists(original_path):
         print(f"Dataset not found: {original_path}")
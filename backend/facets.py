@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+def _count(values: pd.Series) -> dict:
+    # Sorted by number of movies, most common values first
+    return {str(value): int(count) for value, count in values.value_counts().items()}
+
+
+def compute_facets(dataset: pd.DataFrame, era_ranges: dict) -> dict:
+    """
+    Movie counts per genre and language, overall and per era, computed once when the dataset is loaded
+    """
+    genres = dataset["genres"].fillna("").str.split("-").explode().str.strip()
+    genres = genres[genres.str.len() > 0]
+    # Count every movie once per genre, even if the genre is listed twice
+    genres = genres[~pd.MultiIndex.from_arrays([genres.index, genres]).duplicated()]
+    languages = dataset["original_language"].astype(str)
+
+    facets = {
+        "genres": _count(genres),
+        "languages": _count(languages),
+        "eras": {}
+    }
+
+    for era, (start, end) in era_ranges.items():
+        in_era = dataset["release_year"].between(start, end)
+        facets["eras"][era] = {
+            "genres": _count(genres[in_era.reindex(genres.index).to_numpy()]),
+            "languages": _count(languages[in_era])
+        }
+
+    return facets
+
+
+class FacetIndex:
+    """
+    Inverted index over the filter fields, one packed bitset of dataset rows per genre, language and era
+    """
+    def __init__(self, dataset: pd.DataFrame, genre_bits: dict, era_ranges: dict):
+        self.size = len(dataset)
+
+        # Movies considered at all, independent of the preferences
+        self._base = np.packbits(((dataset["popularity"] > 10.0) & (dataset["vote_average"] > 0.5)).to_numpy())
+
+        genre_masks = dataset["genre_mask"].to_numpy()
+        self._genres = {genre: np.packbits((genre_masks & bit) != 0) for genre, bit in genre_bits.items()}
+
+        languages = dataset["original_language"].astype("category")
+        codes = languages.cat.codes.to_numpy()
+        self._languages = {str(language): np.packbits(codes == i) for i, language in enumerate(languages.cat.categories)}
+
+        years = dataset["release_year"]
+        self._eras = {era: np.packbits(years.between(start, end).to_numpy()) for era, (start, end) in era_ranges.items()}
+
+        self._empty = np.zeros_like(self._base)
+
+    def match(self, genres: list[str] | None = None, era: str | None = None, language: str | None = None) -> np.ndarray:
+        """
+        Packed bitset of the movies matching any of the genres, the era and the language, unset fields match everything
+        """
+        if era is not None and era not in self._eras:
+            raise ValueError(f"Invalid era: {era}")
+
+        bits = self._base.copy()
+
+        if genres is not None:
+            any_genre = self._empty.copy()
+            for genre in genres:
+                np.bitwise_or(any_genre, self._genres.get(genre.strip().lower(), self._empty), out=any_genre)
+            bits &= any_genre
+
+        if era is not None:
+            bits &= self._eras[era]
+
+        if language is not None:
+            bits &= self._languages.get(language, self._empty)
+
+        return bits
+
+    def count(self, bits: np.ndarray) -> int:
+        return int(np.bitwise_count(bits).sum())
+
+    def rows(self, bits: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
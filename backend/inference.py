@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+
+
+class ExecutorSaturatedError(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers: int, queue_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        # One slot per running or waiting task, so the queue in front of the workers stays bounded
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturatedError("Inference executor is saturated")
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def stream(self, fn, *args):
+        """
+        Runs a generator function in a single slot and yields its items as soon as they are produced
+        """
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for item in fn(*args):
+                    loop.call_soon_threadsafe(items.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, done)
+
+        future = self.submit(produce)
+        # A task cancelled before it started never reaches the finally block above
+        future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(items.put_nowait, done))
+
+        while (item := await items.get()) is not done:
+            yield item
+
+        # Raise the exception of the generator, if any
+        await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class GetMovieDescriptionInput(BaseModel):
     title: str
@@ -11,3 +11,12 @@ class GetMovieRecommendationsInput(BaseModel):
     language: str
     additionalNotes: str
     genres: list[str]
+    # Number of recommendations and how many of the best ranked ones to skip
+    k: int = Field(default=4, ge=1, le=100)
+    offset: int = Field(default=0, ge=0)
+
+class GetMovieCountInput(BaseModel):
+    # Partial preferences, fields that are not selected yet match every movie
+    era: str | None = None
+    language: str | None = None
+    genres: list[str] | None = None
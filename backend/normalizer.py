@@ -0,0 +1,40 @@
+from functools import lru_cache
+import re
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+
+# Part of the movie fingerprints (see preprocess.add_fingerprints), bump whenever normalize_text changes its output
+NORMALIZER_VERSION = 2
+
+_non_alpha = re.compile(r"[^a-zA-Z\s]")
+_lemmatizer = WordNetLemmatizer()
+_stop_words = None
+
+
+def get_stop_words() -> frozenset:
+    # Loaded on first use, so that every (worker) process reads the corpus only once
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = frozenset(stopwords.words("english"))
+    return _stop_words
+
+
+@lru_cache(maxsize=500_000)
+def lemmatize(token: str) -> str:
+    # The vocabulary is heavily repetitive, so every distinct token only gets lemmatized once
+    return _lemmatizer.lemmatize(token)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercases, strips non-alphabetic characters, drops stopwords and short tokens and lemmatizes the rest.
+    Shared by the offline preprocessing and the online query path, so both produce identical tokens.
+    """
+    if not isinstance(text, str):
+        return ""
+
+    # After stripping everything but letters and whitespace, splitting on whitespace is a complete tokenizer
+    tokens = _non_alpha.sub(" ", text.lower()).split()
+    stop_words = get_stop_words()
+
+    return " ".join(lemmatize(token) for token in tokens if len(token) > 2 and token not in stop_words)
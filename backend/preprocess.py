@@ -1,9 +1,37 @@
-import re
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
 import time
 import pandas as pd
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datasets import load_dataset
+from normalizer import NORMALIZER_VERSION, normalize_text
+
+OUTPUT_PATH = "../data/movies_dataset_preprocessed.parquet"
+
+# Source fields that determine the rich features and the stores built from them (see build.py)
+FINGERPRINT_COLUMNS = ["id", "title", "overview", "genres", "keywords", "credits"]
+# Bump whenever create_rich_features changes, so that the rich features of every movie get recreated
+RICH_FEATURES_VERSION = 1
+
+# Explicit schema of the preprocessed dataset, identical for every written chunk
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("title", pa.string()),
+    ("genres", pa.string()),
+    ("original_language", pa.dictionary(pa.int32(), pa.string())),
+    ("overview", pa.string()),
+    ("popularity", pa.float32()),
+    ("vote_average", pa.float32()),
+    ("keywords", pa.string()),
+    ("credits", pa.string()),
+    ("poster_path", pa.string()),
+    ("release_year", pa.int16()),
+    ("fingerprint", pa.uint64()),
+    ("rich_features", pa.string())
+])
 
 COLUMNS = ["id", "title", "genres", "original_language", "overview", "popularity", "vote_average", "release_date", "status", "keywords",
            "credits", "poster_path"]
@@ -38,35 +66,53 @@ def get_release_year(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def correct_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    df["id"] = df["id"].astype("int64")
     df["title"] = df["title"].astype("string")
     df["genres"] = df["genres"].astype("string")
-    df["original_language"] = df["original_language"].astype("string")
+    df["original_language"] = df["original_language"].astype("category")
     df["overview"] = df["overview"].astype("string")
+    df["popularity"] = df["popularity"].astype("float32")
+    df["vote_average"] = df["vote_average"].astype("float32")
     df["keywords"] = df["keywords"].astype("string")
+    df["credits"] = df["credits"].astype("string")
+    df["poster_path"] = df["poster_path"].astype("string")
+    df["release_year"] = df["release_year"].astype("int16")
     return df
 
 
-def clean_text(text: str, lt: WordNetLemmatizer, sws: set) -> str:
-    if not isinstance(text, str):
-        return ""
+def add_fingerprints(df: pd.DataFrame) -> pd.DataFrame:
+    # Stable 64 bit hash per movie, changes whenever one of its source fields or the text pipeline changes
+    fingerprint_source = df[FINGERPRINT_COLUMNS].assign(normalizer_version=NORMALIZER_VERSION,
+                                                        rich_features_version=RICH_FEATURES_VERSION)
+    df["fingerprint"] = pd.util.hash_pandas_object(fingerprint_source, index=False).to_numpy()
+    return df
+
+
+def load_previous_fingerprints(path: str) -> pd.Index:
+    # Only the fingerprints are kept in memory, the rich features are read per chunk (see read_previous_rich_features)
+    if not os.path.exists(path):
+        return pd.Index([], dtype="uint64")
 
-    text = re.sub(r"[^a-zA-Z\s]", " ", text.lower())
-    tokens = word_tokenize(text)
-    lemmatized_tokens = []
-    for token in tokens:
-        if token not in sws and len(token) > 2:
-            lemmatized_tokens.append(lt.lemmatize(token))
+    return pd.Index(pq.read_table(path, columns=["fingerprint"])["fingerprint"].to_numpy()).unique()
 
-    return " ".join(lemmatized_tokens)
 
+def read_previous_rich_features(path: str, fingerprints) -> pd.Series:
+    if len(fingerprints) == 0:
+        return pd.Series(dtype="string")
 
-def create_rich_features(row, lt: WordNetLemmatizer, sws: set) -> str:
+    previous = pq.read_table(path, columns=["fingerprint", "rich_features"],
+                             filters=[("fingerprint", "in", pa.array(fingerprints, type=pa.uint64()))]).to_pandas()
+    previous = previous.drop_duplicates("fingerprint")
+    return previous.set_index("fingerprint")["rich_features"]
+
+
+def create_rich_features(row) -> str:
     features = [
-        clean_text(str(row["title"]), lt, sws),
-        clean_text(str(row["overview"]), lt, sws),
-        clean_text(str(row["genres"]), lt, sws),
-        clean_text(str(row["keywords"]), lt, sws),
-        clean_text(str(row["credits"]), lt, sws)
+        normalize_text(str(row["title"])),
+        normalize_text(str(row["overview"])),
+        normalize_text(str(row["genres"])),
+        normalize_text(str(row["keywords"])),
+        normalize_text(str(row["credits"]))
     ]
 
     rich_text = " ".join(filter(None, features))
@@ -77,44 +123,134 @@ def create_rich_features(row, lt: WordNetLemmatizer, sws: set) -> str:
     return "No rich features"
 
 
-def add_rich_feature_column(old_df, lt, sws):
+def add_rich_feature_column(old_df):
     new_df = old_df.copy()
-    new_df["rich_features"] = new_df.apply(lambda row: create_rich_features(row, lt, sws), axis=1)
+    new_df["rich_features"] = new_df.apply(create_rich_features, axis=1).astype("string")
     return new_df
 
 
-def print_details(df):
-    print(df.head())
-    print(len(df))
-    column_names = list(df.columns)
-    print(column_names)
+def process_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df.assign(rich_features=pd.Series(dtype="string"))
 
+    return add_rich_feature_column(df)
 
-def main():
-    print("Starting preprocessing")
 
-    print("Reading CSV")
-    df = pd.read_csv("../data/movies_dataset.csv")
-    print("Preparing lemmatizer and stopword set")
-    lt = WordNetLemmatizer()
-    sws = set(stopwords.words("english"))
+def process_chunks(chunks, workers: int, previous: pd.Index):
+    """
+    Yields every chunk with the rich features of its new or changed movies, keeping the input order
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, process_chunk(chunk[~chunk["fingerprint"].isin(previous)])
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    in_flight = deque()
+
+    try:
+        for chunk in chunks:
+            # Only new or changed movies need their rich features created
+            pending = chunk[~chunk["fingerprint"].isin(previous)]
+            in_flight.append((chunk, executor.submit(process_chunk, pending)))
+
+            # Bound the number of chunks in memory, so that streamed input is not read ahead entirely
+            if len(in_flight) >= 2 * workers:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def add_rich_feature_column_parallel(chunks, output_path: str, workers: int, previous: pd.Index | None = None):
+    """
+    Writes the chunks with rich features to output_path, reusing those of the previous output for known fingerprints
+    """
+    if previous is None:
+        previous = pd.Index([], dtype="uint64")
+
+    tmp_path = output_path + ".tmp"
+    writer = pq.ParquetWriter(tmp_path, SCHEMA)
+
+    try:
+        # Results arrive in chunk order and are appended to the output file right away
+        for i, (chunk, processed) in enumerate(process_chunks(chunks, workers, previous)):
+            chunk = chunk.copy()
+            reused = chunk["fingerprint"][chunk["fingerprint"].isin(previous)].unique()
+            previous_rich_features = read_previous_rich_features(output_path, reused)
+            chunk["rich_features"] = chunk["fingerprint"].map(previous_rich_features).astype("string")
+            chunk.loc[processed.index, "rich_features"] = processed["rich_features"]
+
+            writer.write_table(pa.Table.from_pandas(chunk, schema=SCHEMA, preserve_index=False))
+            print(f"Processed chunk {i + 1} ({len(chunk)} movies, {len(processed)} new or changed)")
+    finally:
+        writer.close()
+
+    os.replace(tmp_path, output_path)
+
 
-    print("Dropping columns")
+def prepare_movies(df: pd.DataFrame) -> pd.DataFrame:
     df = drop_columns(df)
-    print("Filtering released movies")
     df = filter_released_movies(df)
-    print("Dropping NA")
-    df = drop_na(df)  # cuts from 700.000 to 180.000 entries
-    print("Getting release year")
+    df = drop_na(df)
     df = get_release_year(df)
-    print("Correcting dtypes")
     df = correct_dtypes(df)
-    print("Adding rich feature column")
-    df = add_rich_feature_column(df, lt, sws)
-    print("Saving to CSV")
-    df.to_csv("../data/movies_dataset_preprocessed.csv")
+    df = add_fingerprints(df)
+    return df
+
+
+def read_chunks(chunk_size: int):
+    print("Reading CSV")
+    df = pd.read_csv("../data/movies_dataset.csv")
+
+    print("Dropping columns, filtering released movies, dropping NA and getting release year")
+    df = prepare_movies(df)  # cuts from 700.000 to 180.000 entries
+
+    for i in range(0, len(df), chunk_size):
+        yield df.iloc[i:i + chunk_size]
+
+
+def stream_chunks(chunk_size: int):
+    # Iterates the Hugging Face dataset in record batches instead of materializing the raw CSV
+    dataset = load_dataset("wykonos/movies", split="train", streaming=True)
+
+    for batch in dataset.iter(batch_size=chunk_size):
+        df = prepare_movies(pd.DataFrame(batch))
+
+        if not df.empty:
+            yield df
+
+
+def print_details(path: str):
+    # Reads only the metadata and the first row group, so that large outputs are not loaded entirely
+    parquet_file = pq.ParquetFile(path)
+    print(parquet_file.read_row_group(0).to_pandas().head() if parquet_file.num_row_groups > 0 else "No movies")
+    print(parquet_file.metadata.num_rows)
+    print(parquet_file.schema_arrow.names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess the raw movie dataset")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes creating rich features")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows per processed and written chunk")
+    parser.add_argument("--full", action="store_true", help="recreate the rich features of all movies")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the dataset from Hugging Face in batches instead of reading the fetched CSV")
+    args = parser.parse_args()
+
+    print("Starting preprocessing")
+
+    previous = pd.Index([], dtype="uint64") if args.full else load_previous_fingerprints(OUTPUT_PATH)
+    chunks = stream_chunks(args.chunk_size) if args.stream else read_chunks(args.chunk_size)
+
+    print(f"Adding rich feature column and saving to Parquet ({args.workers} workers)")
+    add_rich_feature_column_parallel(chunks, OUTPUT_PATH, args.workers, previous)
 
-    print_details(df)
+    print_details(OUTPUT_PATH)
 
 
 if __name__ == "__main__":
@@ -1,19 +1,51 @@
+from backends import load_emotion_pipeline, load_semantic_model
+from batching import MicroBatcher
+from config import (INFERENCE_BACKEND, QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS, RERANK_CANDIDATES, apply_runtime_config,
+                    get_device)
+from facets import FacetIndex, compute_facets
+import hnswlib
 from inputTypes import GetMovieRecommendationsInput
-from nltk.corpus import stopwords
-from nltk import WordNetLemmatizer, word_tokenize
+from normalizer import normalize_text
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import pickle
-import re
-from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import torch
-from transformers import pipeline
+import scipy.sparse as sp
+import time
+
+SEMANTIC_MODEL = "sentence-transformers/all-mpnet-base-v2"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+
+EMBEDDINGS_PATH = "../data/movies_embeddings.npy"
+EMBEDDING_IDS_PATH = "../data/movies_embedding_ids.npy"
+ANN_INDEX_PATH = "../data/movies_ann_index.bin"
+EMOTIONS_PATH = "../data/movies_emotions.npy"
+TFIDF_MODEL_PATH = "../data/movies_tfidf.pkl"
+TFIDF_MATRIX_PATH = "../data/movies_tfidf.npz"
+
+# Columns needed for filtering and presenting recommendations, the large text columns are not needed for serving
+DATASET_COLUMNS = ["id", "title", "genres", "original_language", "popularity", "vote_average", "release_year",
+                   "poster_path"]
+
+# Labels of the emotion model, in the column order of the emotion store
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+
+
+def get_emotion_distributions(emotion_analyzer, texts: list[str], batch_size: int = 32) -> np.ndarray:
+    # Let the pipeline batch the texts, truncate them at token level and return the scores of all labels
+    results = emotion_analyzer(texts, batch_size=batch_size, truncation=True, top_k=None)
+    distributions = np.zeros((len(texts), len(EMOTION_LABELS)), dtype=np.float32)
+
+    for i, result in enumerate(results or []):
+        for entry in result:
+            if entry.get("label") in EMOTION_LABELS:
+                distributions[i, EMOTION_LABELS.index(entry["label"])] = float(entry["score"])
+
+    return distributions
+
 
 class MovieRecommender:
-    def __init__(self, dataset_path: str):
+    def __init__(self, dataset_path: str, lazy: bool = False):
         print("Defining constants...")
         self._era_ranges = {
             "any": (1895, 2024),
@@ -49,227 +81,286 @@ class MovieRecommender:
             "vote_average": 0.025
         }
 
-        print("Loading dataset...")
-        self.dataset = pd.read_csv(dataset_path)
+        # Up to this many filtered movies are scored by the first stage, larger sets are narrowed down semantically
+        self._exact_search_limit = 20000
+        # Number of semantically closest movies retrieved from larger sets
+        self._candidate_limit = 1000
+        # Number of first stage candidates that get re-ranked with the emotion aware scoring
+        self._rerank_limit = RERANK_CANDIDATES
+
+        # Load state of the individual components ("pending", "loading", "ready" or "failed")
+        self.dataset_path = dataset_path
+        self.components = {
+            "dataset": "pending",
+            "stores": "pending",
+            "models": "pending",
+            "warmup": "pending"
+        }
 
-        print("Selecting device...")
-        self.device = self._get_device()
-
-        print("Initializing models...")
-        self.semantic_model = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-        self.emotion_analyzer = pipeline("text-classification",
-                                      model="j-hartmann/emotion-english-distilroberta-base",
-                                      device=self.device)
-        self.tfidf = TfidfVectorizer(max_features=5000, min_df=2, max_df=0.95, stop_words="english", ngram_range=(1, 2))
-        self.semantic_model.to(self.device)
-
-        print("Setting up NLP utilities (lemmatizer and stopwords)...")
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words("english"))
-
-        print("Setting up cache directory...")
-        self.cache_dir = Path("cache")
-        self.cache_dir.mkdir(exist_ok=True)
-
-    def _get_device(self):
-        if torch.cuda.is_available():
-            print("CUDA available")
-            return torch.device("cuda")
-        elif torch.backends.mps.is_available():
-            print("MPS available")
-            return torch.device("mps")
-        else:
-            print("Fallback to CPU")
-            return torch.device("cpu")
+        if not lazy:
+            self.load()
 
-    def _clean_text(self, text: str) -> str:
-        if not isinstance(text, str) or not text.strip():
-            return "NEUTRAL"
+    @property
+    def is_ready(self) -> bool:
+        return all(state == "ready" for state in self.components.values())
 
-        text = re.sub(r"[^a-zA-Z\s]", " ", text.lower())
-        tokens = word_tokenize(text)
+    def load(self) -> None:
+        self._load_component("dataset", self._load_dataset)
+        self._load_component("stores", self._load_stores)
+        self._load_component("models", self._load_models)
+        self._load_component("warmup", self._warm_up)
 
-        lemmatized_tokens = []
-        for token in tokens:
-            if token not in self.stop_words and len(token) > 2:
-                lemmatized_tokens.append(self.lemmatizer.lemmatize(token))
+    def _load_component(self, name: str, loader) -> None:
+        self.components[name] = "loading"
 
-        cleaned_text = " ".join(lemmatized_tokens)
-
-        if cleaned_text.strip():
-            return cleaned_text
+        try:
+            loader()
+        except Exception:
+            self.components[name] = "failed"
+            raise
 
-        return "NEUTRAL"
+        self.components[name] = "ready"
 
-    def _get_cached_embeddings(self, cache_key: str) -> np.ndarray | None:
-        cache_file = self.cache_dir / f"{cache_key}.pkl"
-
-        if cache_file.exists():
-            return pickle.load(cache_file.open("rb"))
-
-        return None
-
-    def _set_cached_embeddings(self, embeddings: list, cache_key: str) -> None:
-        cache_file = self.cache_dir / f"{cache_key}.pkl"
-        with cache_file.open("wb") as f:
-            pickle.dump(embeddings, f)
-
-    def _get_emotion_score(self, text: str, desired_emotions: list[str]) -> float:
-        raw_results = self.emotion_analyzer(text[:512])
-        results = list(raw_results) if raw_results is not None else []
-
-        if not results:
-            return 0.5
-
-        result = results[0]
-        if not isinstance(result, dict):
-            return 0.5
-
-        emotion = result.get("label")
-        confidence = result.get("score")
-
-        if emotion is None or confidence is None:
-            return 0.5
-
-        if isinstance(confidence, torch.Tensor):
-            confidence = float(confidence)
-
-        return confidence if emotion in desired_emotions else 0.25
-
-    def _compute_similarity_score(self,
-                                semantic_sim: np.ndarray,
-                                tfidf_sim: np.ndarray,
-                                emotion_scores: np.ndarray,
-                                popularity: np.ndarray,
-                                vote_average: np.ndarray) -> np.ndarray:
-        def normalize(x):
-            if x.max() == x.min():
-                return np.zeros_like(x)
-            return (x - x.min()) / (x.max() - x.min())
-
-        normalized_semantic = normalize(semantic_sim)
-        normalized_tfidf = normalize(tfidf_sim)
-        normalized_emotion = normalize(emotion_scores)
-        normalized_popularity = normalize(popularity)
-        normalized_vote = normalize(vote_average)
-
-        return (
-            self._similarity_weights["semantic"] * normalized_semantic +
-            self._similarity_weights["tfidf"] * normalized_tfidf +
-            self._similarity_weights["emotion"] * normalized_emotion +
-            self._similarity_weights["popularity"] * normalized_popularity +
-            self._similarity_weights["vote_average"] * normalized_vote
-        )
-
-    def _generate_recommendations(self, movies_df: pd.DataFrame,
-                                preferences: GetMovieRecommendationsInput) -> pd.DataFrame:
-        if movies_df.empty:
-            raise ValueError("No movies matching with trivial criteria. Maybe loosen the criteria...")
+    def _load_dataset(self) -> None:
+        print("Loading dataset...")
+        self.dataset = pd.read_parquet(self.dataset_path, columns=DATASET_COLUMNS)
+        self._prepare_dataset()
+        # Genre and language lookups are served from these counts instead of scanning the dataset per request
+        self.facets = compute_facets(self.dataset, self._era_ranges)
+        self.facet_index = FacetIndex(self.dataset, self._genre_bits, self._era_ranges)
 
-        if movies_df["rich_features"].str.len().sum() == 0:
-            raise ValueError(
-                "Rich features missing in dataset. Maybe call fetch.py/preprocess.py before starting the backend...")
+    def _load_stores(self) -> None:
+        print("Loading embedding store...")
+        self._load_embeddings()
+        self._load_ann_index()
+        self._load_tfidf()
 
-        # Find potentially cached embeddings
-        cache_key = f"movies_{preferences.mood}_{preferences.era}_{preferences.language}_{'-'.join(preferences.genres)}_{len(movies_df)}"
-        semantic_embeddings = self._get_cached_embeddings(cache_key)
+    def _load_models(self) -> None:
+        apply_runtime_config()
 
-        # If no cached embeddings, encode text features and cache them
-        if semantic_embeddings is None:
-            semantic_embeddings = self.semantic_model.encode(
-                movies_df["rich_features"].to_numpy(),
-                batch_size=32,
-                show_progress_bar=True
-            )
-            self._set_cached_embeddings(semantic_embeddings, cache_key)
+        print("Selecting device...")
+        self.device = get_device()
+
+        print(f"Initializing models ({INFERENCE_BACKEND} backend)...")
+        self.semantic_model = load_semantic_model(SEMANTIC_MODEL, INFERENCE_BACKEND, self.device)
+        self.emotion_analyzer = load_emotion_pipeline(EMOTION_MODEL, INFERENCE_BACKEND, self.device)
+
+        # Coalesce the single-text inferences of concurrent requests into batches
+        self.query_encoder = MicroBatcher(
+            lambda texts: self.semantic_model.encode(texts, batch_size=len(texts), normalize_embeddings=True),
+            max_batch_size=QUERY_BATCH_SIZE, max_wait=QUERY_BATCH_WAIT_MS / 1000, name="query-encoder")
+        self.notes_classifier = MicroBatcher(
+            lambda texts: get_emotion_distributions(self.emotion_analyzer, texts, batch_size=len(texts)),
+            max_batch_size=QUERY_BATCH_SIZE, max_wait=QUERY_BATCH_WAIT_MS / 1000, name="notes-classifier")
+
+    def _warm_up(self) -> None:
+        # Run every model once, so that the first real request does not pay for lazy initialization
+        print("Warming up models...")
+        query_text = "uplifting warm up"
+        self.query_encoder(query_text)
+        self.notes_classifier(query_text)
+        self.tfidf.transform([self._clean_text(query_text)])
+
+    def _prepare_dataset(self) -> None:
+        self.dataset = self.dataset.reset_index(drop=True)
+        self.dataset["original_language"] = self.dataset["original_language"].astype("category")
+        self.dataset["release_year"] = self.dataset["release_year"].astype(np.int16)
+
+        # Encode the genres of every movie as a bitmask over the (lowercased) genre vocabulary
+        genres = self.dataset["genres"].fillna("").str.lower().str.split("-").explode().str.strip()
+        genres = genres[genres.str.len() > 0]
+        vocabulary = sorted(genres.unique())
+
+        if len(vocabulary) > 32:
+            raise ValueError(f"Too many genres for a 32 bit genre mask: {len(vocabulary)}")
+
+        self._genre_bits = {genre: np.uint32(1 << i) for i, genre in enumerate(vocabulary)}
+
+        genre_masks = np.zeros(len(self.dataset), dtype=np.uint32)
+        np.bitwise_or.at(genre_masks, genres.index.to_numpy(), genres.map(self._genre_bits).to_numpy(dtype=np.uint32))
+        self.dataset["genre_mask"] = genre_masks
+
+    def count_movies(self, genres: list[str] | None = None, era: str | None = None, language: str | None = None) -> int:
+        # Number of movies passing the trivial criteria of a (partial) preference, answered from the facet index only
+        return self.facet_index.count(self.facet_index.match(genres, era, language))
+
+    def _load_embeddings(self) -> None:
+        if not Path(EMBEDDINGS_PATH).exists() or not Path(EMBEDDING_IDS_PATH).exists():
+            raise ValueError("Embedding store missing. Maybe call build.py before starting the backend...")
+
+        # Memory-map the store read-only, so that all worker processes share the page cache
+        # instead of each holding a private copy (only the candidate rows are read per request)
+        self.embeddings = np.load(EMBEDDINGS_PATH, mmap_mode="r")
+        embedding_ids = np.load(EMBEDDING_IDS_PATH)
+
+        if not Path(EMOTIONS_PATH).exists():
+            raise ValueError("Emotion store missing. Maybe re-run build.py...")
+
+        # Emotion distributions of the movie overviews share the rows of the embedding store
+        self.emotions = np.load(EMOTIONS_PATH, mmap_mode="r")
+
+        # Map every dataset row to its row in the embedding store by movie id
+        # (keeps working for subsets of the dataset, e.g. the reduced evaluation dataset)
+        id_to_row = pd.Series(np.arange(len(embedding_ids)), index=embedding_ids)
+        id_to_row = id_to_row[~id_to_row.index.duplicated()]
+        embedding_rows = id_to_row.reindex(self.dataset["id"].to_numpy())
+
+        if embedding_rows.isna().any():
+            raise ValueError("Embedding store does not match the dataset. Maybe re-run build.py...")
+
+        self.dataset["embedding_row"] = embedding_rows.to_numpy(dtype=np.int64)
+
+    def _load_ann_index(self) -> None:
+        if not Path(ANN_INDEX_PATH).exists():
+            print("ANN index missing, falling back to exact search. Maybe re-run build.py...")
+            self.ann_index = None
+            return
+
+        self.ann_index = hnswlib.Index(space="ip", dim=self.embeddings.shape[1])
+        self.ann_index.load_index(ANN_INDEX_PATH, max_elements=self.embeddings.shape[0])
+        self.ann_index.set_ef(2 * self._candidate_limit)
+
+    def _load_tfidf(self) -> None:
+        if not Path(TFIDF_MODEL_PATH).exists() or not Path(TFIDF_MATRIX_PATH).exists():
+            raise ValueError("TF-IDF model missing. Maybe re-run build.py...")
+
+        # The vectorizer is fitted once on the whole corpus and only used read-only afterwards,
+        # the document matrix shares the rows of the embedding store
+        with open(TFIDF_MODEL_PATH, "rb") as f:
+            self.tfidf = pickle.load(f)
+        self.tfidf_matrix = sp.load_npz(TFIDF_MATRIX_PATH).tocsr()
+
+        print(f"TF-IDF vocabulary size: {len(self.tfidf.vocabulary_)}")
 
-        # Fit and transform TF-IDF
-        try:
-            tfidf_matrix = self.tfidf.fit_transform(movies_df["rich_features"])
-            print(f"TF-IDF vocabulary size: {len(self.tfidf.vocabulary_)}")
-        except ValueError as e:
-            print(f"TF-IDF error: {e}")
-            print("Sample of rich_features:")
-            print(movies_df["rich_features"].head())
-            raise
+    def _clean_text(self, text: str) -> str:
+        cleaned_text = normalize_text(text)
 
-        # Encode query text
-        query_text = f"{preferences.mood} {preferences.additionalNotes}"
-        query_embedding = self.semantic_model.encode([query_text])
+        if cleaned_text.strip():
+            return cleaned_text
 
-        # Calculate cosine similarities
-        semantic_similarities = cosine_similarity(query_embedding, semantic_embeddings)[0]
-        tfidf_similarities = cosine_similarity(self.tfidf.transform([self._clean_text(query_text)]), tfidf_matrix)[0]
+        return "NEUTRAL"
 
-        # Extract desired emotion based on the user input mood
+    def _get_emotion_target(self, preferences: GetMovieRecommendationsInput) -> np.ndarray:
+        # Put full weight on the emotions that belong to the desired mood
         desired_emotions = self._mood_to_emotion.get(preferences.mood.lower(), ["neutral"])
-
-        # Calculate emotion alignment
-        emotion_scores = np.array([
-            self._get_emotion_score(f"{text} {preferences.additionalNotes}", desired_emotions)
-            for text in movies_df["overview"]
-        ])
+        target = np.array([1.0 if label in desired_emotions else 0.0 for label in EMOTION_LABELS], dtype=np.float32)
+
+        # Shift the target towards the emotions of the additional notes (scored once per query)
+        if preferences.additionalNotes.strip():
+            target += self.notes_classifier(preferences.additionalNotes)
+
+        return target
+
+    def _compute_similarity_score(self, components: dict[str, np.ndarray]) -> tuple[np.ndarray, dict]:
+        """
+        Weighted sum of the min-max normalized components, plus the (minimum, scale) used to normalize each of them
+        """
+        size = len(next(iter(components.values())))
+        scores = np.zeros(size, dtype=np.float32)
+        buffer = np.empty(size, dtype=np.float32)
+        normalizers = {}
+
+        for name, values in components.items():
+            low, high = values.min(), values.max()
+            scale = 1.0 / (high - low) if high > low else 0.0
+            normalizers[name] = (low, scale)
+
+            # Normalize, weight and accumulate in place instead of allocating a copy per step
+            np.subtract(values, low, out=buffer, casting="unsafe")
+            buffer *= self._similarity_weights[name] * scale
+            scores += buffer
+
+        return scores, normalizers
+
+    def _select_top(self, scores: np.ndarray, k: int, offset: int = 0) -> np.ndarray:
+        # Only the best offset + k scores get sorted, the rest is partitioned away
+        end = min(offset + k, len(scores))
+        if offset >= end:
+            return np.empty(0, dtype=np.int64)
+
+        top_indices = np.argpartition(-scores, end - 1)[:end] if end < len(scores) else np.arange(len(scores))
+        top_indices = top_indices[np.argsort(-scores[top_indices], kind="stable")]
+        return top_indices[offset:end]
+
+    def _retrieve_candidates(self, movies_df: pd.DataFrame, query_embedding: np.ndarray) -> pd.DataFrame:
+        # Bounds the work of the first stage, independent of how broad the filters are
+        if len(movies_df) <= self._exact_search_limit:
+            return movies_df
+
+        embedding_rows = movies_df["embedding_row"].to_numpy()
+
+        if self.ann_index is not None:
+            # Search the whole catalogue, only accepting movies that passed the trivial criteria
+            allowed_rows = set(embedding_rows.tolist())
+            try:
+                labels, _ = self.ann_index.knn_query(query_embedding, k=self._candidate_limit, num_threads=1,
+                                                     filter=lambda label: label in allowed_rows)
+                return movies_df[np.isin(embedding_rows, labels[0])]
+            except RuntimeError as e:
+                print(f"ANN search failed, falling back to exact search: {e}")
+
+        similarities = self.embeddings[embedding_rows].astype(np.float32) @ query_embedding[0]
+        top_indices = np.argpartition(similarities, -self._candidate_limit)[-self._candidate_limit:]
+        return movies_df.iloc[top_indices]
+
+    def _first_stage(self, movies_df: pd.DataFrame, query_text: str, query_embedding: np.ndarray) -> pd.DataFrame:
+        """
+        Cheap scoring with the precomputed stores only, returns the best candidates for re-ranking, best first
+        """
+        embedding_rows = movies_df["embedding_row"].to_numpy()
+
+        # Calculate cosine similarities (all vectors are normalized, so a dot product suffices)
+        semantic_similarities = self.embeddings[embedding_rows].astype(np.float32) @ query_embedding[0]
+        query_tfidf = self.tfidf.transform([self._clean_text(query_text)])
+        tfidf_similarities = (self.tfidf_matrix[embedding_rows] @ query_tfidf.T).toarray().ravel()
+
+        components = {"semantic": semantic_similarities, "tfidf": tfidf_similarities}
+        scores, normalizers = self._compute_similarity_score(components)
+
+        top_indices = self._select_top(scores, self._rerank_limit)
+        candidates = movies_df.iloc[top_indices].copy()
+        candidates["confidence_score"] = scores[top_indices]
+
+        # The raw similarities are reused by the second stage
+        for name, (low, scale) in normalizers.items():
+            candidates[f"{name}_similarity"] = components[name][top_indices]
+            candidates[f"{name}_score"] = (components[name][top_indices] - low) * scale
+
+        return candidates
+
+    def _generate_recommendations(self, candidates: pd.DataFrame,
+                                  preferences: GetMovieRecommendationsInput) -> pd.DataFrame:
+        embedding_rows = candidates["embedding_row"].to_numpy()
+
+        # Calculate emotion alignment of the precomputed emotion distributions with the desired emotions
+        emotion_scores = self.emotions[embedding_rows] @ self._get_emotion_target(preferences)
+
+        components = {
+            "semantic": candidates["semantic_similarity"].to_numpy(),
+            "tfidf": candidates["tfidf_similarity"].to_numpy(),
+            "emotion": emotion_scores,
+            "popularity": candidates["popularity"].to_numpy(),
+            "vote_average": candidates["vote_average"].to_numpy()
+        }
 
         # Get final similarity scores
-        final_scores = self._compute_similarity_score(
-            semantic_similarities,
-            tfidf_similarities,
-            emotion_scores,
-            movies_df["popularity"].to_numpy(),
-            movies_df["vote_average"].to_numpy()
-        )
-
-        # Getting the top 4 recommendations
-        top_indices = final_scores.argsort()[-4:][::-1]
-        recommendations = movies_df.iloc[top_indices].copy()
+        final_scores, normalizers = self._compute_similarity_score(components)
+
+        # Getting the top k recommendations after the offset
+        top_indices = self._select_top(final_scores, preferences.k, preferences.offset)
+        recommendations = candidates.iloc[top_indices].copy()
 
         # Add confidence score to recommendations
         # TODO: Maybe use this in frontend to visualize usefulness to user
         recommendations["confidence_score"] = final_scores[top_indices]
 
-        return recommendations
-
-    def _compare_genres(self, movie_genres: str, preferred_genres: list[str]) -> bool:
-        # Check if either of the lists is empty
-        if not movie_genres or not preferred_genres:
-            return False
-
-        # Lowercase for case-insensitive comparison
-        movie_genres_lower = movie_genres.lower()
-        preferred_genres_lower = [genre.lower() for genre in preferred_genres]
-
-        # Check if any of the preferred genres is in movie genres with nice inline syntax
-        return any(genre in movie_genres_lower for genre in preferred_genres_lower)
-
-    def get_movies(self, preferences: GetMovieRecommendationsInput) -> list[dict]:
-        # Convert era name to range
-        era_range = self._era_ranges.get(preferences.era)
+        # Normalized value of every component, to explain the confidence score
+        for name, (low, scale) in normalizers.items():
+            recommendations[f"{name}_score"] = (components[name][top_indices] - low) * scale
 
-        if era_range is None:
-            raise ValueError(f"Invalid era: {preferences.era}")
-
-        # Pre-Filter based on trivial criteria to reduce the dataset size
-        # TODO: Might improve language selection in frontend later
-        # TODO: Add support for selection of multiple languages
-        # TODO: Add support for selecting any language
-        filtered_df = pd.DataFrame(self.dataset[
-            (self.dataset["original_language"] == preferences.language) &
-            (self.dataset["release_year"].between(era_range[0], era_range[1])) &
-            (self.dataset["genres"].apply(lambda x: self._compare_genres(x, preferences.genres))) &
-            (self.dataset["popularity"] > 10.0) &
-            (self.dataset["vote_average"] > 0.5)
-        ])
-
-        print(f"Movies left after filtering: {len(filtered_df)}")
-
-        # If more than 1000 movies, sample a subset to improve recommendation performance
-        if len(filtered_df) > 1000:
-            filtered_df = filtered_df.sample(1000)
-
-        # Generate recommendations
-        recommendations_pre = self._generate_recommendations(filtered_df, preferences)
+        return recommendations
 
-        # Post-process recommendations
+    def _post_process(self, recommendations_pre: pd.DataFrame) -> list[dict]:
         # TODO: Maybe cleaner way may be possible
         recommendations_post = []
         for i, row in recommendations_pre.iterrows():
@@ -279,9 +370,83 @@ class MovieRecommender:
                 "rating": float(row["vote_average"]),
                 "year": str(row["release_year"]),
                 "poster": str(row["poster_path"]),
-                "confidence": row["confidence_score"],
+                "confidence": float(row["confidence_score"]),
+                "scores": {name: float(row[f"{name}_score"]) for name in self._similarity_weights
+                           if f"{name}_score" in row},
                 "popularity": float(row["popularity"]),
                 "language": str(row["original_language"])
             })
 
         return recommendations_post
+
+    def match_preferences(self, preferences: GetMovieRecommendationsInput) -> np.ndarray:
+        """
+        Packed bitset of the movies passing the trivial criteria, rejects empty selections before any embedding work
+        """
+        # TODO: Might improve language selection in frontend later
+        # TODO: Add support for selection of multiple languages
+        # TODO: Add support for selecting any language
+        matching = self.facet_index.match(preferences.genres, preferences.era, preferences.language)
+
+        if self.facet_index.count(matching) == 0:
+            raise ValueError("No movies matching with trivial criteria. Maybe loosen the criteria...")
+
+        return matching
+
+    def get_query_text(self, preferences: GetMovieRecommendationsInput) -> str:
+        return f"{preferences.mood} {preferences.additionalNotes}"
+
+    def iter_movies(self, preferences: GetMovieRecommendationsInput, preview: bool = True,
+                    query_embedding: np.ndarray | None = None):
+        """
+        Yields (stage, recommendations), the first stage ranking as "retrieval" preview (if requested) and the "final" ranking
+
+        The query embedding may be passed in if it was already encoded (e.g. batched with concurrent requests)
+        """
+        start_time = time.perf_counter()
+
+        # Pre-Filter based on trivial criteria to reduce the dataset size
+        matching = self.match_preferences(preferences)
+        filtered_df = self.dataset.iloc[self.facet_index.rows(matching)]
+
+        print(f"Movies left after filtering: {len(filtered_df)}")
+        timings = {"filter": time.perf_counter() - start_time}
+
+        # Encode query text
+        stage_start = time.perf_counter()
+        query_text = self.get_query_text(preferences)
+        if query_embedding is None:
+            query_embedding = self.query_encoder(query_text)
+        query_embedding = query_embedding[np.newaxis]
+        timings["encoding"] = time.perf_counter() - stage_start
+
+        # If more movies than can be scored exactly, keep only the semantically closest ones
+        stage_start = time.perf_counter()
+        candidates_df = self._retrieve_candidates(filtered_df, query_embedding)
+        timings["retrieval"] = time.perf_counter() - stage_start
+
+        # First stage: semantic and TF-IDF similarity from the precomputed stores
+        stage_start = time.perf_counter()
+        candidates_df = self._first_stage(candidates_df, query_text, query_embedding)
+        timings["first_stage"] = time.perf_counter() - stage_start
+
+        print(f"Movies left after first stage: {len(candidates_df)}")
+
+        if preview:
+            # Candidates are ordered by their first stage score already
+            yield "retrieval", self._post_process(candidates_df.iloc[preferences.offset:preferences.offset + preferences.k])
+
+        # Second stage: emotion and notes aware re-ranking of the first stage candidates
+        stage_start = time.perf_counter()
+        recommendations_pre = self._generate_recommendations(candidates_df, preferences)
+        timings["second_stage"] = time.perf_counter() - stage_start
+
+        print("Stage timings: " + ", ".join(f"{stage} {duration * 1000:.1f}ms" for stage, duration in timings.items()))
+
+        yield "final", self._post_process(recommendations_pre)
+
+    def get_movies(self, preferences: GetMovieRecommendationsInput) -> list[dict]:
+        for _, recommendations in self.iter_movies(preferences, preview=False):
+            pass
+
+        return recommendations
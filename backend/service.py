@@ -1,37 +1,102 @@
+import asyncio
+import hashlib
+import json
+from cache import DiskCache, LRUCache, TieredCache
+from config import runtime_diagnostics
 from recommender import MovieRecommender
-from inputTypes import GetMovieRecommendationsInput, GetMovieDescriptionInput
-from subtitles import initializeOpensubtitles, downloadAndSaveSubtitle, checkSubtitleFile, summarizeSubtitles, extractKeyThemes
+from inputTypes import GetMovieRecommendationsInput, GetMovieDescriptionInput, GetMovieCountInput
+from subtitles import initializeOpensubtitles, downloadAndSaveSubtitle, checkSubtitleFile, summarizeSubtitles, extractKeyThemes, descriptionCacheKey
 
-recommender = MovieRecommender("../data/movies_dataset_preprocessed.csv")
+# Models are loaded in the background (see loadRecommender), so that the API is reachable right away
+recommender = MovieRecommender("../data/movies_dataset_preprocessed.parquet", lazy=True)
+
+# Generated descriptions, kept in memory for popular titles and on disk (max. 50 MB) across restarts
+description_cache = TieredCache(LRUCache(maxsize=256), DiskCache("../data/descriptions", max_bytes=50 * 1024 * 1024))
+
+# Final ranked lists of the most popular preference combinations, refreshed after an hour
+recommendation_cache = LRUCache(maxsize=1024, ttl=60 * 60)
+# Length of the cached ranked lists, pages beyond it are not available
+RANKED_RECOMMENDATIONS = 100
+
+# Genre and language responses with their ETag, see facetResponse
+facet_responses = {}
+
+def loadRecommender():
+    try:
+        recommender.load()
+        print("Recommender ready")
+    except Exception as e:
+        print(f"Loading recommender failed: {e}")
 
-def proceedAvailableGenres():
-    genres = []
 
-    for i in range(len(recommender.dataset)):
-        temp = recommender.dataset["genres"][i].split("-")
-        for genre in temp:
-            if genre not in genres:
-                genres.append(genre)
+def proceedReadiness():
+    return {
+        "ready": recommender.is_ready,
+        "components": dict(recommender.components)
+    }
 
-    return genres
+
+def facetResponse(name: str):
+    # Facets only change with the dataset, so every response and its ETag is built once
+    response = facet_responses.get(name)
+
+    if response is None:
+        facets = recommender.facets
+        content = {
+            name: list(facets[name]),
+            "counts": facets[name],
+            "eras": {era: era_facets[name] for era, era_facets in facets["eras"].items()}
+        }
+        etag = '"' + hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()[:32] + '"'
+        response = facet_responses.setdefault(name, (content, etag))
+
+    return response
+
+
+def proceedAvailableGenres():
+    return facetResponse("genres")
 
 
 def proceedAvailableLanguages():
-    language_counts = {}
+    return facetResponse("languages")
+
+
+def proceedDiagnostics():
+    return {
+        "runtime": runtime_diagnostics(),
+        "components": dict(recommender.components)
+    }
+
 
-    for i in range(len(recommender.dataset)):
-        lang = recommender.dataset["original_language"][i]
-        language_counts[lang] = language_counts.get(lang, 0) + 1
+def proceedCacheStats():
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "descriptions": description_cache.memory.stats()
+    }
 
-    sorted_languages = sorted(language_counts.items(), key=lambda x: x[1], reverse=True)
-    languages = [language for language, _ in sorted_languages]
 
-    return languages
+def normalizePreferences(input: GetMovieRecommendationsInput):
+    # Equivalent preferences (casing, genre order, whitespace) lead to the same recommendations and cache entry
+    return GetMovieRecommendationsInput(
+        mood=input.mood.strip().lower(),
+        era=input.era.strip().lower(),
+        language=input.language.strip().lower(),
+        additionalNotes=" ".join(input.additionalNotes.split()),
+        genres=sorted({genre.strip().lower() for genre in input.genres if genre.strip()}),
+        k=input.k,
+        offset=input.offset
+    )
 
-def proceedMovieRecommendation(input: GetMovieRecommendationsInput):
-    print(f"Generating recommendation for: {input}")
 
-    recommendations = recommender.get_movies(input)
+def proceedMovieCount(input: GetMovieCountInput):
+    return recommender.count_movies(
+        genres=input.genres,
+        era=input.era.strip().lower() if input.era is not None else None,
+        language=input.language.strip().lower() if input.language is not None else None
+    )
+
+
+def cleanRecommendations(recommendations: list[dict]):
     # Cleaning entires from recommendations which are only used for evaluation
     result = []
     for recommendation in recommendations:
@@ -41,10 +106,65 @@ def proceedMovieRecommendation(input: GetMovieRecommendationsInput):
           "rating": recommendation["rating"],
           "year": recommendation["year"],
           "poster": recommendation["poster"],
-          "confidence": recommendation["confidence"]
+          "confidence": recommendation["confidence"],
+          "scores": recommendation["scores"]
         })
 
-    print(f"Generated recommendations: {recommendations}")
+    return result
+
+
+def paginateRecommendations(ranked: list[dict], input: GetMovieRecommendationsInput):
+    end = input.offset + input.k
+    return {
+        "movies": ranked[input.offset:end],
+        "nextOffset": end if end < len(ranked) else None
+    }
+
+
+def recommendationCacheKey(input: GetMovieRecommendationsInput):
+    # Pages of the same preferences share one cached ranked list
+    return json.dumps(input.model_dump(exclude={"k", "offset"}), sort_keys=True)
+
+
+async def encodeRecommendationQuery(input: GetMovieRecommendationsInput):
+    """
+    Encodes the query text before the request takes an inference thread, so that all requests in flight can share
+    one batch of the query encoder. Returns None if the recommendations are cached already
+    """
+    input = normalizePreferences(input)
+    if recommendationCacheKey(input) in recommendation_cache:
+        return None
+
+    recommender.match_preferences(input)
+    return await asyncio.wrap_future(recommender.query_encoder.submit(recommender.get_query_text(input)))
+
+
+def proceedMovieRecommendationStages(input: GetMovieRecommendationsInput, preview: bool = True, query_embedding=None):
+    input = normalizePreferences(input)
+    cache_key = recommendationCacheKey(input)
+
+    ranked = recommendation_cache.get(cache_key)
+    if ranked is not None:
+        print(f"Using cached recommendation for: {input}")
+    else:
+        print(f"Generating recommendation for: {input}")
+
+        ranking = input.model_copy(update={"k": RANKED_RECOMMENDATIONS, "offset": 0})
+        for stage, recommendations in recommender.iter_movies(ranking, preview, query_embedding):
+            ranked = cleanRecommendations(recommendations)
+            if stage != "final":
+                yield {"stage": stage, **paginateRecommendations(ranked, input)}
+
+        print(f"Generated recommendations: {ranked[:input.offset + input.k]}")
+        recommendation_cache.set(cache_key, ranked)
+
+    yield {"stage": "final", **paginateRecommendations(ranked, input)}
+
+
+def proceedMovieRecommendation(input: GetMovieRecommendationsInput, query_embedding=None):
+    for result in proceedMovieRecommendationStages(input, preview=False, query_embedding=query_embedding):
+        pass
+
     return result
 
 
@@ -54,6 +174,13 @@ def proceedMovieDescription(input: GetMovieDescriptionInput):
     movie_name = f"{input.year} - {input.title}"
     language = "en"                                             # TODO: Summarys in different languages?
 
+    cache_key = descriptionCacheKey(movie_name, 3)
+    description = description_cache.get(cache_key)
+
+    if description is not None:
+        print(f"Using cached description for '{movie_name}'")
+        return description
+
     # Due to the API limit subtitles will be downloaded
     cleaned_subtitles = checkSubtitleFile(movie_name)
 
@@ -71,4 +198,6 @@ def proceedMovieDescription(input: GetMovieDescriptionInput):
         "summary": summarized_description
         }
 
+    description_cache.set(cache_key, description)
+
     return description
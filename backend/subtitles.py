@@ -1,10 +1,16 @@
+import gc
+import hashlib
+import json
 import re
 import os
+import threading
+import time
 import torch
 from opensubtitlescom import OpenSubtitles
 from transformers import pipeline
 from dotenv import load_dotenv
 from keybert import KeyBERT
+from config import apply_runtime_config, get_device
 
 load_dotenv(dotenv_path='../KEYS.env')
 
@@ -16,6 +22,17 @@ PASSWORD = os.getenv("PASSWORD")
 MAX_SUM_LENGTH = 120
 MIN_SUM_LENGTH = 30
 SAMPLE_SUM = False # decides if summarization is stochastic
+SUM_CHUNK_SIZE = 1024
+
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+KEYBERT_MODEL = "all-MiniLM-L6-v2"
+MODEL_IDLE_TIMEOUT = 30 * 60 # seconds after which an unused model gets evicted (None disables eviction)
+
+# Process-wide model registry, models are loaded on first use and shared across requests
+_models = {}
+_modelsLastUsed = {}
+_modelsLock = threading.RLock()
+_evictionThread = None
 
 def initializeOpensubtitles():
     """Init OpenSubtitles API."""
@@ -102,34 +119,104 @@ def preprocessSubtitles(file_path):
 
     return cleaned_text
 
+def loadModel(name):
+    apply_runtime_config()
+
+    if name == "summarizer":
+        return pipeline("summarization", model=SUMMARY_MODEL, device=get_device())
+    if name == "keybert":
+        return KeyBERT(model=KEYBERT_MODEL)
+    raise ValueError(f"Unknown model: {name}")
+
+
+def getModel(name):
+    """
+    Returns the cached model, loading it on first use
+    """
+    with _modelsLock:
+        if name not in _models:
+            print(f"Loading model '{name}'")
+            _models[name] = loadModel(name)
+
+        _modelsLastUsed[name] = time.time()
+        return _models[name]
+
+
+def evictIdleModels(maxIdle=MODEL_IDLE_TIMEOUT):
+    """
+    Drops models that have not been used for maxIdle seconds to reclaim memory
+    """
+    if maxIdle is None:
+        return
+
+    with _modelsLock:
+        now = time.time()
+        idle = [name for name, lastUsed in _modelsLastUsed.items() if now - lastUsed > maxIdle]
+
+        for name in idle:
+            print(f"Evicting idle model '{name}'")
+            del _models[name]
+            del _modelsLastUsed[name]
+
+    if idle:
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+def startModelEviction(interval=60):
+    """
+    Checks for idle models in a daemon thread, so that memory is reclaimed while no requests arrive
+    """
+    global _evictionThread
+
+    if MODEL_IDLE_TIMEOUT is None:
+        return
+
+    def evictPeriodically():
+        while True:
+            time.sleep(interval)
+            evictIdleModels()
+
+    with _modelsLock:
+        if _evictionThread is None:
+            _evictionThread = threading.Thread(target=evictPeriodically, name="model-eviction", daemon=True)
+            _evictionThread.start()
+
+
 def summarizeSubtitles(text):
     """
     Currently only summarizes first chunk of subtitle text (got best results with only first chunk)
     """
-    if torch.cuda.is_available():
-        print("CUDA available")
-        device = torch.device("cuda")
-    elif torch.backends.mps.is_available():
-        print("MPS available")
-        device = torch.device("mps")
-    else:
-        print("Fallback to CPU")
-        device = torch.device("cpu")
-
-    summarizer = pipeline("summarization", model="facebook/bart-large-cnn", device=device)
+    summarizer = getModel("summarizer")
 
-    chunk_size = 1024
-    first_chunk = text[:chunk_size] 
+    first_chunk = text[:SUM_CHUNK_SIZE]
 
     result = summarizer(first_chunk, max_length=MAX_SUM_LENGTH, min_length=MIN_SUM_LENGTH, do_sample=SAMPLE_SUM)
 
     return result[0]['summary_text']
 
+def descriptionCacheKey(movie_name, num_topics=3):
+    """
+    Content address of a generated description: movie plus every model and parameter that shapes the result
+    """
+    parameters = {
+        "movie": movie_name,
+        "summary_model": SUMMARY_MODEL,
+        "keybert_model": KEYBERT_MODEL,
+        "max_length": MAX_SUM_LENGTH,
+        "min_length": MIN_SUM_LENGTH,
+        "sample": SAMPLE_SUM,
+        "chunk_size": SUM_CHUNK_SIZE,
+        "num_topics": num_topics
+    }
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode("utf-8")).hexdigest()
+
 def extractKeyThemes(cleaned_text, num_topics=3):
     """
     Extract key themes from cleaned text using KeyBERT.
     """
-    kw_model = KeyBERT()
+    kw_model = getModel("keybert")
     keywords = kw_model.extract_keywords(cleaned_text, stop_words='english')
     themes = [kw for kw, _ in keywords][:num_topics]
     return themes
\ No newline at end of file
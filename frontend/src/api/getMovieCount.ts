@@ -0,0 +1,32 @@
+interface GetMovieCountInput {
+    era?: string;
+    language?: string;
+    genres?: string[];
+}
+
+interface GetMovieCountResponse {
+    count: number;
+}
+
+export const getMovieCount = async (body: GetMovieCountInput): Promise<GetMovieCountResponse | null> => {
+    const baseUrl = "http://127.0.0.1:8000"
+    const endpoint = "/movieCount"
+    try {
+        const response = await fetch(baseUrl + endpoint, {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify(body)
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to fetch movie count");
+        }
+
+        return await response.json();
+    } catch (error) {
+        console.error("Error fetching getMovieCount:", error);
+        return null;
+    }
+};
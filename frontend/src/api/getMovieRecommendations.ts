@@ -1,15 +1,18 @@
 import {Movie} from "@/lib/types";
 
-interface GetMovieRecommendationsInput {
+export interface GetMovieRecommendationsInput {
     mood: string;
     era: string;
     language: string;
     additionalNotes: string;
     genres: string[];
+    k?: number;
+    offset?: number;
 }
 
-interface GetMovieRecommendationsResponse {
+export interface GetMovieRecommendationsResponse {
     movies: Movie[];
+    nextOffset: number | null;
 }
 
 export const getMovieRecommendation = async (body: GetMovieRecommendationsInput): Promise<GetMovieRecommendationsResponse | null> => {
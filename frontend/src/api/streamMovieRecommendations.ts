@@ -0,0 +1,51 @@
+import {GetMovieRecommendationsInput, GetMovieRecommendationsResponse} from "@/api/getMovieRecommendations";
+
+export interface MovieRecommendationStage extends GetMovieRecommendationsResponse {
+    stage: "retrieval" | "final";
+}
+
+// Calls onStage for every NDJSON line: a quick preview after retrieval, then the final ranking
+export const streamMovieRecommendation = async (body: GetMovieRecommendationsInput, onStage: (stage: MovieRecommendationStage) => void): Promise<boolean> => {
+    const baseUrl = "http://127.0.0.1:8000"
+    const endpoint = "/movieRecommendation/stream"
+    try {
+        console.log("streamMovieRecommendation", body);
+        const response = await fetch(baseUrl + endpoint, {
+            method: "POST",
+            headers: {
+                "Content-Type": "application/json",
+            },
+            body: JSON.stringify(body)
+        });
+
+        if (!response.ok || response.body == null) {
+            throw new Error("Failed to stream recommendations");
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        while (true) {
+            const {done, value} = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, {stream: true});
+            const lines = buffer.split("\n");
+            buffer = lines.pop() ?? "";
+
+            for (const line of lines) {
+                if (line.trim()) {
+                    const stage = JSON.parse(line);
+                    console.log("streamMovieRecommendation Stage:", stage);
+                    onStage(stage);
+                }
+            }
+        }
+
+        return true;
+    } catch (error) {
+        console.error("Error fetching streamMovieRecommendation:", error);
+        return false;
+    }
+};
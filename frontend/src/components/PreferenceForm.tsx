@@ -16,6 +16,7 @@ import GenreStep from "@/components/GenreStep";
 import MoodStep from "@/components/MoodStep";
 import NotesStep from "@/components/NotesStep";
 import { getAvailableLanguages } from "@/api/getAvailableLanguages";
+import { getMovieCount } from "@/api/getMovieCount";
 
 interface PreferenceFormProps {
   genres: string[];
@@ -37,6 +38,7 @@ const PreferenceForm = ({
     additionalNotes: "",
   });
   const [languages, setLanguages] = useState<LanguageOption[]>([]);
+  const [movieCount, setMovieCount] = useState<number | null>(null);
 
   // Fetch languages from getAvailableLanguages() once on first time
   useEffect(() => {
@@ -61,6 +63,34 @@ const PreferenceForm = ({
     });
   }, []);
 
+  // Live number of movies matching the selection so far, fields not selected yet match every movie
+  useEffect(() => {
+    let ignore = false;
+
+    getMovieCount({
+      genres:
+        preferences.genres.length > 0
+          ? preferences.genres.map((genre) => genre.toLowerCase())
+          : undefined,
+      era: preferences.era !== "" ? preferences.era.toLowerCase() : undefined,
+      language:
+        preferences.language !== ""
+          ? preferences.language.toLowerCase()
+          : undefined,
+    }).then((response) => {
+      // Ignore responses of selections that changed in the meantime, an unknown count does not block the form
+      if (!ignore) {
+        setMovieCount(response ? response.count : null);
+      }
+    });
+
+    return () => {
+      ignore = true;
+    };
+  }, [preferences.genres, preferences.era, preferences.language]);
+
+  const noMoviesLeft = movieCount === 0;
+
   const stepDetails = [
     {
       title: "What genres interest you?",
@@ -203,6 +233,18 @@ const PreferenceForm = ({
               />
             )}
           </div>
+
+          {movieCount !== null && (
+            <p
+              className={`text-center text-sm ${
+                noMoviesLeft ? "text-red-600" : "text-slate-500"
+              }`}
+            >
+              {noMoviesLeft
+                ? "No movies match this selection, try loosening it"
+                : `${movieCount.toLocaleString()} movies match your selection`}
+            </p>
+          )}
         </motion.div>
       </AnimatePresence>
 
@@ -231,7 +273,8 @@ const PreferenceForm = ({
                     (step === 1 && preferences.genres.length == 0) ||
                     (step === 2 && preferences.mood === "") ||
                     (step === 3 && preferences.era === "") ||
-                    (step === 4 && preferences.language === "")
+                    (step === 4 && preferences.language === "") ||
+                    noMoviesLeft
                       ? "bg-slate-100 text-slate-400 cursor-not-allowed"
                       : "bg-slate-900 text-white shadow-lg hover:bg-slate-800"
                   }`}
@@ -239,7 +282,8 @@ const PreferenceForm = ({
             (step === 1 && preferences.genres.length == 0) ||
             (step === 2 && preferences.mood === "") ||
             (step === 3 && preferences.era === "") ||
-            (step === 4 && preferences.language === "")
+            (step === 4 && preferences.language === "") ||
+            noMoviesLeft
           }
         >
           {step === 5 ? "Find Movies" : "Continue"}
@@ -13,7 +13,7 @@ import { motion, AnimatePresence } from "framer-motion";
 import { Movie, PreferenceStep } from "@/lib/types";
 import AILoadingAnimation from "@/components/LoadingAnimation";
 import { getMovieDescription } from "@/api/getMovieDescription";
-import { getMovieRecommendation } from "@/api/getMovieRecommendations";
+import { streamMovieRecommendation } from "@/api/streamMovieRecommendations";
 import { HiX } from "react-icons/hi";
 
 interface ResultsStep {
@@ -37,26 +37,31 @@ const ResultsStep = ({ pref }: ResultsStep) => {
       isRequestInProgress.current = true;
 
       try {
-        const response = await getMovieRecommendation({
-          genres: pref.genres.map((genre) => genre.toLowerCase()),
-          mood: pref.mood.toLowerCase(),
-          language: pref.language.toLowerCase(),
-          additionalNotes: pref.additionalNotes.toLowerCase(),
-          era: pref.era.toLowerCase(),
-        });
+        // Show the preview of the retrieval stage right away and replace it with the final ranking
+        const success = await streamMovieRecommendation(
+          {
+            genres: pref.genres.map((genre) => genre.toLowerCase()),
+            mood: pref.mood.toLowerCase(),
+            language: pref.language.toLowerCase(),
+            additionalNotes: pref.additionalNotes.toLowerCase(),
+            era: pref.era.toLowerCase(),
+          },
+          (stage) => {
+            const movies = stage.movies ?? [];
 
-        if (response == null) {
-          setShowError(true);
-          return;
-        }
+            for (let i = 0; i < movies.length; i++) {
+              movies[i].id = i + movies[i].title + movies[i].year;
+            }
 
-        const movies = response?.movies ?? [];
+            setMovies(movies);
+            setIsLoading(false);
+          }
+        );
 
-        for (let i = 0; i < movies.length; i++) {
-          movies[i].id = i + movies[i].title + movies[i].year;
+        if (!success) {
+          setShowError(true);
+          return;
         }
-
-        setMovies(movies);
       } catch (error) {
         setShowError(true);
       } finally {